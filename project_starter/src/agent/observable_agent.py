@@ -1,19 +1,39 @@
 import asyncio
-import json
 import os
+import re
 import time
 
+import orjson
 import structlog
-from litellm import acompletion, completion_cost
+from litellm import completion_cost, stream_chunk_builder
 from pydantic import ValidationError
 
-from src.observability.cost_tracker import CostTracker
+from src.observability.cost_tracker import CostTracker, StepCost
+from src.observability.llm_batcher import llm_batcher
 from src.observability.loop_detector import AdvancedLoopDetector
 from src.observability.tracer import AgentStep, AgentTracer, ToolCallRecord
 from src.tools.registry import registry
 
 logger = structlog.get_logger()
 
+# Max number of queued step records the log writer handles per wake-up
+LOG_BATCH_SIZE = 16
+
+# Characters of a compacted tool output that stay in the conversation
+COMPACT_HEAD_CHARS = 500
+
+# In-flight LLM calls allowed per model unless an agent asks for another limit
+DEFAULT_CONCURRENCY = 8
+
+_loads = orjson.loads
+
+def _dumps(obj) -> str:
+    """Serialize a tool result to JSON text (falls back to str() for unknown types)."""
+    try:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    except orjson.JSONEncodeError:
+        return str(obj)
+
 class ObservableAgent:
     """
     Production-grade agent with full observability.
@@ -22,6 +42,11 @@ class ObservableAgent:
     with "Observability" - the ability to track, trace, and debug the agent's 
     internal state and actions.
     """
+    # One LLM concurrency limit per model, shared by every agent using it.
+    # Semaphores belong to one event loop, so they are keyed by (loop, model).
+    _model_limits: dict[str, int] = {}
+    _model_semaphores: dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Semaphore] = {}
+
     def __init__(
         self,
         model: str = None,
@@ -30,6 +55,11 @@ class ObservableAgent:
         verbose: bool = True,
         system_prompt: str = None,
         tools: list = None,
+        compact_threshold: int | None = 12,
+        compact_keep_recent: int = 6,
+        concurrency: int | None = None,
+        tool_concurrency: int = 4,
+        max_history: int | None = None,
     ):
         self.model = model or os.getenv("MODEL_NAME", "gemini/gemini-1.5-flash")
         self.max_steps = max_steps
@@ -37,145 +67,189 @@ class ObservableAgent:
         self.system_prompt = system_prompt
         self.tools = tools if tools is not None else registry.get_all_tools()
 
+        # Context compaction: once the conversation exceeds `compact_threshold`
+        # messages, tool outputs older than the last `compact_keep_recent`
+        # messages are cut down to their first COMPACT_HEAD_CHARS characters
+        # (None disables compaction). Full outputs stay in the trace's tool calls.
+        self.compact_threshold = compact_threshold
+        self.compact_keep_recent = compact_keep_recent
+
+        # Bound in-flight LLM calls per model across all agents (to stay under
+        # provider rate limits) and in-flight tool calls per agent
+        limit = self._model_limits.setdefault(self.model, concurrency or DEFAULT_CONCURRENCY)
+        if concurrency is not None and concurrency != limit:
+            logger.warning("concurrency_ignored", model=self.model, requested=concurrency, limit=limit)
+        self.tool_concurrency = tool_concurrency
+        self._tool_sem_loop: asyncio.AbstractEventLoop | None = None
+
         # Initialize observability components
-        self.tracer = AgentTracer(verbose=verbose)
+        # Traces keep at most `max_history` steps (None keeps them all)
+        self.tracer = AgentTracer(verbose=verbose, max_history=max_history)
         self.loop_detector = AdvancedLoopDetector()
         self.cost_tracker = CostTracker()
 
+    @property
+    def _llm_sem(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._model_semaphores.get((loop, self.model))
+        if semaphore is None:
+            # Forget the semaphores of event loops that have been closed
+            for key in [key for key in self._model_semaphores if key[0].is_closed()]:
+                del self._model_semaphores[key]
+            semaphore = asyncio.Semaphore(self._model_limits[self.model])
+            self._model_semaphores[(loop, self.model)] = semaphore
+        return semaphore
+
+    @property
+    def _tool_sem(self) -> asyncio.Semaphore:
+        # Rebuilt when the agent is reused from a new event loop
+        loop = asyncio.get_running_loop()
+        if self._tool_sem_loop is not loop:
+            self._tool_sem_loop = loop
+            self._tool_semaphore = asyncio.Semaphore(self.tool_concurrency)
+        return self._tool_semaphore
+
+    @property
+    def system_prompt(self) -> str | None:
+        return self._system_prompt
+
+    @system_prompt.setter
+    def system_prompt(self, system_prompt: str | None):
+        # The system prompt (and the tool schemas sent before it) is identical on
+        # every call, so build the message once and mark it as a cacheable prefix.
+        # Anthropic needs an explicit cache_control block; OpenAI and Gemini
+        # cache long repeated prefixes automatically.
+        self._system_prompt = system_prompt
+        if not system_prompt:
+            self._system_message = None
+        elif "claude" in self.model or self.model.startswith("anthropic/"):
+            self._system_message = {
+                "role": "system",
+                "content": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
+            }
+        else:
+            self._system_message = {"role": "system", "content": system_prompt}
+
+    @property
+    def tools(self) -> list:
+        return self._tools
+
+    @tools.setter
+    def tools(self, tools: list):
+        # Tools are fixed for the agent's lifetime, so build their schemas once
+        # here instead of on every step of the loop.
+        self._tools = list(tools)
+        self._tool_schemas = [tool.to_openai_schema() for tool in self._tools] or None
+        self._tool_choice = "auto" if self._tool_schemas else None
+        self._no_tools = not self._tools
+
     async def run(self, user_query: str) -> dict:
         """Execute the agent loop with full observability."""
+        return await self._run(user_query, use_tools=not self._no_tools)
+
+    async def _run(self, user_query: str, use_tools: bool) -> dict:
         # Start trace and cost tracking
         trace_id = self.tracer.start_trace(self.agent_name, user_query, self.model)
         self.cost_tracker.start_query(user_query)
+        # Step records are handed to the tracer by a background writer task so
+        # logging I/O stays off the path between one LLM call and the next.
+        # Each run owns its queue and writer, so overlapping runs don't collide.
+        log_q, log_writer = self._start_log_writer()
         
         messages = []
-        if self.system_prompt:
-            messages.append({"role": "system", "content": self.system_prompt})
+        if self._system_message:
+            messages.append(self._system_message)
         messages.append({"role": "user", "content": user_query})
+        compacted_upto = 0
         
         step_number = 0
         final_answer = None
         
         try:
-            # Loop until max_steps
-            for step_number in range(1, self.max_steps + 1):
-                step_start = time.time()
-                
-                # Call LLM
-                tool_schemas = [tool.to_openai_schema() for tool in self.tools]
-                
-                response = await acompletion(
-                    model=self.model,
-                    messages=messages,
-                    tools=tool_schemas if tool_schemas else None,
-                    tool_choice="auto" if tool_schemas else None,
-                )
+            if not use_tools:
+                # Without tools the first response is the final answer,
+                # so skip the ReAct loop and make a single call
+                step_number = 1
+                final_answer = await self._answer_directly(trace_id, messages, log_q)
+            else:
+                # Loop until max_steps
+                for step_number in range(1, self.max_steps + 1):
+                    step_start = time.perf_counter_ns()
                 
-                step_duration = (time.time() - step_start) * 1000
+                    # Call LLM; tool calls start running while the response streams in
+                    response, tool_jobs = await self._stream_completion(messages)
                 
-                # Log completion and cost
-                self.cost_tracker.log_completion(step_number, response, is_tool_call=False)
+                    step_duration = (time.perf_counter_ns() - step_start) / 1_000_000
                 
-                assistant_message = response.choices[0].message
-                reasoning = assistant_message.content
+                    # Log completion and cost
+                    step_cost = self.cost_tracker.log_completion(step_number, response, is_tool_call=False)
                 
-                # Create step record
-                step = AgentStep(
-                    step_number=step_number,
-                    reasoning=reasoning,
-                    duration_ms=step_duration,
-                )
+                    assistant_message = response.choices[0].message
+                    reasoning = assistant_message.content
+                    tool_calls = getattr(assistant_message, 'tool_calls', None) or None
                 
-                # Extract usage stats
-                if hasattr(response, 'usage'):
-                    usage = response.usage
-                    step.input_tokens = getattr(usage, 'prompt_tokens', 0)
-                    step.output_tokens = getattr(usage, 'completion_tokens', 0)
-                    
-                    # Calculate cost
-                    input_cost = (step.input_tokens / 1_000_000) * 0.15
-                    output_cost = (step.output_tokens / 1_000_000) * 0.60
-                    step.cost_usd = input_cost + output_cost
-                
-                # Add assistant message to conversation
-                messages.append({
-                    "role": "assistant",
-                    "content": reasoning,
-                    "tool_calls": assistant_message.tool_calls if hasattr(assistant_message, 'tool_calls') and assistant_message.tool_calls else None
-                })
+                    # Add assistant message to conversation
+                    messages.append({
+                        "role": "assistant",
+                        "content": reasoning,
+                        "tool_calls": tool_calls
+                    })
                 
-                # Handle tool calls
-                tool_calls = getattr(assistant_message, 'tool_calls', None)
+                    if not tool_calls:
+                        # No tool calls - this is the final answer
+                        final_answer = reasoning
+                        step = self._make_step(step_number, reasoning, step_duration, step_cost)
+                        log_q.put_nowait((trace_id, step))
+                        break
                 
-                if not tool_calls:
-                    # No tool calls - this is the final answer
-                    final_answer = reasoning
-                    self.tracer.log_step(trace_id, step)
-                    break
+                    # Wait for the tools started during streaming (they run in parallel)
+                    await asyncio.gather(*(job for job in tool_jobs.values() if isinstance(job, asyncio.Task)))
                 
-                # Execute tool calls (in parallel if multiple)
-                tool_call_tasks = []
-                for tool_call in tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_input_str = tool_call.function.arguments
+                    # Add tool results to step and messages, in the order the model called them
+                    tool_records = []
+                    for tool_call in tool_calls:
+                        job = tool_jobs.get(tool_call.id, f"Error: tool call '{tool_call.id}' was not executed")
+                        if isinstance(job, asyncio.Task):
+                            tool_name, tool_input, tool_output, duration = job.result()
+                            tool_records.append(ToolCallRecord(
+                                tool_name=tool_name,
+                                tool_input=tool_input,
+                                tool_output=tool_output,
+                                duration_ms=duration
+                            ))
+                        else:
+                            # Loop warning or argument error produced instead of running the tool
+                            tool_name, tool_output = tool_call.function.name, job
                     
-                    # Check for loops BEFORE executing
-                    loop_result = self.loop_detector.check_tool_call(tool_name, tool_input_str)
-                    
-                    if loop_result.is_looping:
-                        logger.warning("loop_detected", 
-                                     strategy=loop_result.strategy,
-                                     message=loop_result.message)
-                        
-                        # Add loop warning to messages
                         messages.append({
                             "role": "tool",
                             "tool_call_id": tool_call.id,
                             "name": tool_name,
-                            "content": f"⚠️ LOOP DETECTED: {loop_result.message}"
+                            "content": tool_output
                         })
-                        continue
-                    
-                    # Execute tool
-                    tool_call_tasks.append(
-                        self._execute_tool(tool_call, tool_name, tool_input_str)
-                    )
                 
-                # Execute all tools in parallel
-                tool_results = await asyncio.gather(*tool_call_tasks)
-                
-                # Add tool results to step and messages
-                for tool_call, (tool_name, tool_input_str, tool_output, duration) in zip(tool_calls, tool_results):
-                    step.tool_calls.append(ToolCallRecord(
-                        tool_name=tool_name,
-                        tool_input=json.loads(tool_input_str) if tool_input_str else {},
-                        tool_output=tool_output,
-                        duration_ms=duration
-                    ))
-                    
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_name,
-                        "content": tool_output
-                    })
+                    # Log the step
+                    step = self._make_step(step_number, reasoning, step_duration, step_cost, tool_records)
+                    log_q.put_nowait((trace_id, step))
                 
-                # Log the step
-                self.tracer.log_step(trace_id, step)
+                    # Keep the resent history from growing with every old tool output
+                    if self.compact_threshold and len(messages) > self.compact_threshold:
+                        compacted_upto = self._compact_messages(messages, compacted_upto)
                 
-                # Check for output stagnation
-                if reasoning:
-                    stagnation = self.loop_detector.check_output_stagnation(reasoning)
-                    if stagnation.is_looping:
-                        logger.warning("stagnation_detected", message=stagnation.message)
-                        final_answer = f"Agent stopped due to stagnation: {stagnation.message}"
-                        break
+                    # Check for output stagnation
+                    if reasoning:
+                        stagnation = self.loop_detector.check_output_stagnation(reasoning)
+                        if stagnation.is_looping:
+                            logger.warning("stagnation_detected", message=stagnation.message)
+                            final_answer = f"Agent stopped due to stagnation: {stagnation.message}"
+                            break
             
             # If we exhausted max_steps without final answer
             if final_answer is None:
                 final_answer = f"Agent reached max steps ({self.max_steps}) without completing the task."
             
-            # End trace
+            # End trace once every queued step has reached the tracer
+            await self._stop_log_writer(log_q, log_writer)
             self.tracer.end_trace(trace_id, final_answer, status="completed")
             self.cost_tracker.end_query()
             
@@ -188,6 +262,7 @@ class ObservableAgent:
             
         except Exception as e:
             logger.error("agent_error", error=str(e), trace_id=trace_id)
+            await self._stop_log_writer(log_q, log_writer)
             self.tracer.end_trace(trace_id, "", status="error", error=str(e))
             self.cost_tracker.end_query()
             
@@ -196,20 +271,275 @@ class ObservableAgent:
                 "trace_id": trace_id,
                 "status": "error"
             }
-    
-    async def _execute_tool(self, tool_call, tool_name: str, tool_input_str: str):
+
+        finally:
+            # Also stops the writer when the run itself is cancelled
+            log_writer.cancel()
+
+    @staticmethod
+    def _make_step(step_number: int, reasoning: str | None, duration_ms: float,
+                   step_cost: StepCost | None, tool_calls: list | None = None) -> AgentStep:
+        """Build a fully populated step record in a single constructor call."""
+        return AgentStep(
+            step_number=step_number,
+            reasoning=reasoning,
+            tool_calls=tool_calls if tool_calls is not None else [],
+            input_tokens=step_cost.input_tokens if step_cost else 0,
+            output_tokens=step_cost.output_tokens if step_cost else 0,
+            cost_usd=step_cost.cost_usd if step_cost else 0.0,
+            duration_ms=duration_ms,
+        )
+
+    async def _stream_completion(self, messages: list) -> tuple:
+        """
+        Stream one LLM response, starting each tool call as soon as its
+        arguments form complete JSON so tools overlap with the rest of the
+        generation.
+
+        Returns the reassembled response and a dict mapping tool_call ids to
+        either the running tool task or a ready tool message (loop warning or
+        argument error).
+        """
+        chunks = []
+        builders: dict[int, dict] = {}  # tool call index -> id, name, arguments so far
+        tool_jobs: dict = {}
+        try:
+            # The model's concurrency slot is held until the whole response has streamed in
+            async with self._llm_sem:
+                stream = await llm_batcher.submit(
+                    model=self.model,
+                    messages=messages,
+                    tools=self._tool_schemas,
+                    tool_choice=self._tool_choice,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    if not chunk.choices:
+                        continue
+                    for delta_call in chunk.choices[0].delta.tool_calls or []:
+                        builder = builders.setdefault(delta_call.index, {"id": None, "name": "", "arguments": ""})
+                        if delta_call.id:
+                            builder["id"] = delta_call.id
+                        if delta_call.function:
+                            if delta_call.function.name:
+                                builder["name"] = delta_call.function.name
+                            if delta_call.function.arguments:
+                                builder["arguments"] += delta_call.function.arguments
+                        self._start_tool_call(builder, tool_jobs, final=False)
+
+            # Whatever is still pending (e.g. empty or malformed arguments) starts now
+            for builder in builders.values():
+                self._start_tool_call(builder, tool_jobs, final=True)
+        except BaseException:
+            for job in tool_jobs.values():
+                if isinstance(job, asyncio.Task):
+                    job.cancel()
+            raise
+
+        return stream_chunk_builder(chunks, messages=messages), tool_jobs
+
+    def _start_tool_call(self, builder: dict, tool_jobs: dict, final: bool):
+        """Start a streamed tool call once its arguments are complete."""
+        tool_call_id = builder["id"]
+        if tool_call_id is None or tool_call_id in tool_jobs:
+            return
+        tool_name, tool_input_str = builder["name"], builder["arguments"]
+        if not tool_input_str and not final:
+            return
+        
+        # Parse arguments once; the dict is shared by the tool and the trace.
+        # Until the stream ends, a parse error just means more arguments are coming.
+        try:
+            tool_input = _loads(tool_input_str) if tool_input_str else {}
+        except orjson.JSONDecodeError as e:
+            if final:
+                tool_jobs[tool_call_id] = f"Error executing {tool_name}: invalid JSON arguments ({e})"
+            return
+        
+        # Check for loops BEFORE executing
+        loop_result = self.loop_detector.check_tool_call(tool_name, tool_input_str)
+        if loop_result.is_looping:
+            logger.warning("loop_detected", 
+                         strategy=loop_result.strategy,
+                         message=loop_result.message)
+            tool_jobs[tool_call_id] = f"⚠️ LOOP DETECTED: {loop_result.message}"
+            return
+        
+        tool_jobs[tool_call_id] = asyncio.create_task(self._execute_tool(tool_name, tool_input))
+
+    async def _answer_directly(self, trace_id: str, messages: list, log_q: asyncio.Queue) -> str:
+        """Answer with a single tool-free LLM call (used by agents without tools)."""
+        step_start = time.perf_counter_ns()
+        async with self._llm_sem:
+            response = await llm_batcher.submit(model=self.model, messages=messages)
+        step_duration = (time.perf_counter_ns() - step_start) / 1_000_000
+
+        step_cost = self.cost_tracker.log_completion(1, response, is_tool_call=False)
+        reasoning = response.choices[0].message.content
+
+        log_q.put_nowait((trace_id, self._make_step(1, reasoning, step_duration, step_cost)))
+        return reasoning
+
+    async def run_batch(self, prompts: list[str]) -> list[dict]:
+        """
+        Answer several prompts with a single LLM request.
+
+        Identical prompts are sampled as multiple drafts with ``n=``. Distinct
+        prompts are packed into one numbered message so the system prompt and
+        the shared request overhead are paid once. Tools are never offered,
+        whatever the number of prompts.
+        """
+        if len(prompts) <= 1:
+            return [await self._run(prompt, use_tools=False) for prompt in prompts]
+
+        batch_query = f"Batch of {len(prompts)} prompts"
+        trace_id = self.tracer.start_trace(self.agent_name, batch_query, self.model)
+        self.cost_tracker.start_query(batch_query)
+
+        messages = []
+        if self._system_message:
+            messages.append(self._system_message)
+
+        same_prompt = len(set(prompts)) == 1
+        if same_prompt:
+            messages.append({"role": "user", "content": prompts[0]})
+        else:
+            numbered = "\n\n".join(f"### Prompt {i}\n{prompt}" for i, prompt in enumerate(prompts, 1))
+            messages.append({
+                "role": "user",
+                "content": (
+                    f"Answer each of the following {len(prompts)} prompts independently. "
+                    f"Start each answer with a line '### Answer <number>' matching its prompt.\n\n{numbered}"
+                ),
+            })
+
+        try:
+            step_start = time.perf_counter_ns()
+            async with self._llm_sem:
+                response = await llm_batcher.submit(
+                    model=self.model,
+                    messages=messages,
+                    n=len(prompts) if same_prompt else 1,
+                )
+            step_duration = (time.perf_counter_ns() - step_start) / 1_000_000
+
+            step_cost = self.cost_tracker.log_completion(1, response, is_tool_call=False)
+
+            if same_prompt:
+                answers = [choice.message.content for choice in response.choices]
+                if len(answers) != len(prompts):
+                    answers = None
+            else:
+                answers = self._split_batch_answers(response.choices[0].message.content or "", len(prompts))
+
+            step = self._make_step(1, response.choices[0].message.content, step_duration, step_cost)
+            self.tracer.log_step(trace_id, step)
+
+        except Exception as e:
+            logger.error("agent_error", error=str(e), trace_id=trace_id)
+            self.tracer.end_trace(trace_id, "", status="error", error=str(e))
+            self.cost_tracker.end_query()
+            return [{"answer": f"Error: {str(e)}", "trace_id": trace_id, "status": "error"} for _ in prompts]
+
+        if answers is None:
+            # The model did not follow the answer format; answer one by one
+            logger.warning("batch_split_failed", expected=len(prompts), trace_id=trace_id)
+            self.tracer.end_trace(
+                trace_id, response.choices[0].message.content or "", status="error",
+                error="Batch response could not be split into one answer per prompt",
+            )
+            self.cost_tracker.end_query()
+            return [await self._run(prompt, use_tools=False) for prompt in prompts]
+
+        self.tracer.end_trace(trace_id, "\n\n".join(answers), status="completed")
+        self.cost_tracker.end_query()
+
+        return [
+            {"answer": answer, "trace_id": trace_id, "steps": 1, "status": "completed"}
+            for answer in answers
+        ]
+
+    def _start_log_writer(self) -> tuple[asyncio.Queue, asyncio.Task]:
+        log_q = asyncio.Queue()
+        return log_q, asyncio.create_task(self._drain_logs(log_q))
+
+    @staticmethod
+    async def _stop_log_writer(log_q: asyncio.Queue, log_writer: asyncio.Task):
+        """Wait for queued steps to be logged, then stop the writer."""
+        await log_q.join()
+        log_writer.cancel()
+
+    async def _drain_logs(self, log_q: asyncio.Queue):
+        while True:
+            batch = [await log_q.get()]
+            while len(batch) < LOG_BATCH_SIZE and not log_q.empty():
+                batch.append(log_q.get_nowait())
+            for trace_id, step in batch:
+                try:
+                    self.tracer.log_step(trace_id, step)
+                except Exception as e:
+                    logger.error("log_step_failed", error=str(e), trace_id=trace_id)
+                finally:
+                    log_q.task_done()
+
+    def _compact_messages(self, messages: list, start: int) -> int:
+        """
+        Cut tool outputs in messages[start:-compact_keep_recent] down to their
+        first COMPACT_HEAD_CHARS characters. Returns the new start.
+        """
+        end = len(messages) - self.compact_keep_recent
+        for i in range(start, end):
+            message = messages[i]
+            if message["role"] != "tool":
+                continue
+            content = message["content"]
+            if len(content) > COMPACT_HEAD_CHARS:
+                message["content"] = (
+                    f"[compacted: {message['name']} returned {len(content)} chars, "
+                    f"first {COMPACT_HEAD_CHARS} kept]\n{content[:COMPACT_HEAD_CHARS]}"
+                )
+        return max(start, end)
+
+    @staticmethod
+    def _split_batch_answers(text: str, count: int) -> list[str] | None:
+        """
+        Split a packed batch response on its '### Answer <n>' headers and order
+        the answers by <n>. Returns None unless every number from 1 to count
+        appears exactly once.
+        """
+        # parts = [preamble, n1, answer1, n2, answer2, ...]
+        parts = re.split(r"^###\s*Answer\s+(\d+)\s*$", text, flags=re.MULTILINE)
+        answers = {}
+        for number, answer in zip(parts[1::2], parts[2::2]):
+            index = int(number)
+            if index in answers or not 1 <= index <= count:
+                return None
+            answers[index] = answer.strip()
+        if len(answers) != count:
+            return None
+        return [answers[index] for index in range(1, count + 1)]
+
+    async def _execute_tool(self, tool_name: str, tool_input: dict):
         """Execute a single tool and return result."""
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
         try:
             tool = registry.get_tool(tool_name)
             if not tool:
                 result = f"Error: Tool '{tool_name}' not found"
             else:
-                tool_input = json.loads(tool_input_str)
-                result = str(tool.execute(**tool_input))
+                async with self._tool_sem:
+                    if tool.is_async:
+                        output = await tool.execute(**tool_input)
+                    else:
+                        # Sync tools (HTTP search, page reads) run in a worker thread
+                        # so parallel tool calls do not block the event loop
+                        output = await asyncio.to_thread(tool.execute, **tool_input)
+                result = output if isinstance(output, str) else _dumps(output)
         except Exception as e:
             result = f"Error executing {tool_name}: {str(e)}"
         
-        duration = (time.time() - start_time) * 1000
-        return (tool_name, tool_input_str, result, duration)
\ No newline at end of file
+        duration = (time.perf_counter_ns() - start_time) / 1_000_000
+        return (tool_name, tool_input, result, duration)
\ No newline at end of file
@@ -2,6 +2,8 @@ import asyncio
 import os
 import sys
 
+import httpx
+import litellm
 from dotenv import load_dotenv
 
 from src.agent.specialists import create_researcher, create_analyst, create_writer
@@ -11,6 +13,9 @@ from src.observability.cost_tracker import cost_tracker
 # Load environment variables
 load_dotenv()
 
+# Marks where the Writer should splice in the pre-drafted research section
+RESEARCH_PLACEHOLDER = "[RESEARCH_SECTION]"
+
 async def main():
     """
     Main entry point for the AI Agent system.
@@ -23,12 +28,27 @@ async def main():
     query = sys.argv[1]
     print(f"\n🔍 Starting research on: {query}\n")
 
+    # One pooled HTTP/2 client shared by all agents, so they reuse warm
+    # connections instead of paying a TLS handshake per request. litellm only
+    # uses aclient_session for OpenAI-compatible models (e.g. MODEL_NAME=gpt-4o-mini);
+    # other providers such as Gemini go through litellm's own cached per-provider
+    # client, which already keeps connections alive across calls.
+    shared_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+        timeout=60,
+    )
+    litellm.aclient_session = shared_client
+
     # Initialize agents using Factory Pattern
     researcher = create_researcher()
     analyst = create_analyst()
+    drafter = create_writer()
     writer = create_writer()
 
-    # Simple linear chain: Researcher -> Analyst -> Writer
+    # Pipeline: Researcher -> (Analyst || Drafter) -> Writer
+    # The Analyst and the Drafter only depend on the research output, so they
+    # run concurrently; the Writer is the single join point.
     try:
         # Step 1: Research
         print("📚 Phase 1: Research")
@@ -44,10 +64,13 @@ async def main():
         print(f"\n✅ Research completed in {research_result.get('steps', 0)} steps")
         print(f"Research findings: {research_output[:200]}...\n")
         
-        # Step 2: Analysis
-        print("🔍 Phase 2: Analysis")
+        # Step 2: Analysis, while the research section of the report is drafted
+        print("🔍 Phase 2: Analysis + Drafting")
         analysis_query = f"Analyze the following research findings and provide insights:\n\n{research_output}"
-        analysis_result = await analyst.run(analysis_query)
+        draft_query = f"Write the research findings section of a polished report based on this research. Do not write an introduction or conclusions:\n\n{research_output}"
+        analysis_task = asyncio.create_task(analyst.run(analysis_query))
+        draft_task = asyncio.create_task(drafter.run(draft_query))
+        analysis_result, draft_result = await asyncio.gather(analysis_task, draft_task)
         
         if analysis_result.get("status") == "error":
             print(f"\n❌ Analysis phase failed: {analysis_result.get('answer')}")
@@ -61,15 +84,30 @@ async def main():
         
         # Step 3: Writing
         print("✍️ Phase 3: Writing")
-        writing_query = f"Write a polished, comprehensive report based on this research and analysis:\n\nResearch:\n{research_output}\n\nAnalysis:\n{analysis_output}"
+        one_pass_query = f"Write a polished, comprehensive report based on this research and analysis:\n\nResearch:\n{research_output}\n\nAnalysis:\n{analysis_output}"
+        use_draft = draft_result.get("status") != "error"
+        if use_draft:
+            writing_query = f"Write a polished, comprehensive report based on this research and analysis. The research findings section is already written: do not reproduce it, put the line {RESEARCH_PLACEHOLDER} where it belongs instead.\n\nResearch findings section:\n{draft_result['answer']}\n\nAnalysis:\n{analysis_output}"
+        else:
+            # Fall back to writing the whole report in one pass
+            writing_query = one_pass_query
         writing_result = await writer.run(writing_query)
         
+        if use_draft and writing_result.get("status") != "error" and RESEARCH_PLACEHOLDER not in writing_result["answer"]:
+            # The Writer left out the placeholder, so the drafted section has
+            # nowhere to go; rewrite the report in one pass rather than drop it
+            print(f"\n⚠️ Writer omitted {RESEARCH_PLACEHOLDER}, rewriting the report in one pass")
+            use_draft = False
+            writing_result = await writer.run(one_pass_query)
+        
         if writing_result.get("status") == "error":
             print(f"\n❌ Writing phase failed: {writing_result.get('answer')}")
             cost_tracker.print_cost_breakdown()
             return
         
         final_output = writing_result["answer"]
+        if use_draft:
+            final_output = final_output.replace(RESEARCH_PLACEHOLDER, draft_result["answer"])
         
         # Print final results
         print("\n" + "="*60)
@@ -81,8 +119,9 @@ async def main():
         print("="*60)
         print(f"Research: {research_result.get('steps', 0)} steps")
         print(f"Analysis: {analysis_result.get('steps', 0)} steps")
+        print(f"Drafting: {draft_result.get('steps', 0)} steps")
         print(f"Writing: {writing_result.get('steps', 0)} steps")
-        print(f"Total phases: 3")
+        print(f"Total phases: 3 (4 agents)")
         print("="*60)
         
         # Print cost breakdown
@@ -93,6 +132,9 @@ async def main():
         print(f"\n❌ Error: {str(e)}")
         import traceback
         traceback.print_exc()
+    finally:
+        litellm.aclient_session = None
+        await shared_client.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
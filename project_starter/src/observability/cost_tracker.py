@@ -1,9 +1,35 @@
 import logging
+import sys
 from dataclasses import dataclass, field
+
+import numpy as np
 # from litellm import completion_cost
 
 logger = logging.getLogger(__name__)
 
+# USD per token: (input, output, cached input). Keys are model names without the provider prefix.
+PRICES: dict[str, tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15e-6, 0.60e-6, 0.075e-6),
+    "gpt-4o": (2.50e-6, 10.00e-6, 1.25e-6),
+    "gemini-1.5-flash": (0.075e-6, 0.30e-6, 0.01875e-6),
+    "gemini-1.5-pro": (1.25e-6, 5.00e-6, 0.3125e-6),
+    "claude-3-5-haiku-latest": (0.80e-6, 4.00e-6, 0.08e-6),
+    "claude-3-5-sonnet-latest": (3.00e-6, 15.00e-6, 0.30e-6),
+}
+DEFAULT_MODEL = "gpt-4o-mini"
+
+def _cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    Price a completion, falling back to DEFAULT_MODEL rates for unknown models.
+    `cached_tokens` is the part of `input_tokens` served from the prompt cache.
+    """
+    input_price, output_price, cached_price = PRICES.get(model.rsplit("/", 1)[-1], PRICES[DEFAULT_MODEL])
+    return (
+        (input_tokens - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + output_tokens * output_price
+    )
+
 @dataclass
 class StepCost:
     step_number: int
@@ -12,20 +38,80 @@ class StepCost:
     output_tokens: int
     cost_usd: float
     is_tool_call: bool = False
+    cached_tokens: int = 0
 
 @dataclass
 class QueryCost:
+    """
+    Cost of a single query.
+
+    Steps are stored column-wise (one list per StepCost field) so logging a
+    step is a handful of appends; the columns become NumPy arrays once the
+    query is frozen. `steps` rebuilds StepCost records on demand.
+    """
     query: str
-    steps: list[StepCost] = field(default_factory=list)
     total_cost_usd: float = 0.0
     total_input_tokens: int = 0
     total_output_tokens: int = 0
+    total_cached_tokens: int = 0
+    _step_numbers: list[int] = field(default_factory=list, repr=False)
+    _model_ids: list[int] = field(default_factory=list, repr=False)
+    _input_tokens: list[int] = field(default_factory=list, repr=False)
+    _output_tokens: list[int] = field(default_factory=list, repr=False)
+    _cost_usd: list[float] = field(default_factory=list, repr=False)
+    _is_tool_call: list[bool] = field(default_factory=list, repr=False)
+    _cached_tokens: list[int] = field(default_factory=list, repr=False)
+    _models: list[str] = field(default_factory=list, repr=False)  # indexed by model id
+
+    def add_step(self, step_number: int, model: str, input_tokens: int, output_tokens: int,
+                 cost_usd: float, is_tool_call: bool = False, cached_tokens: int = 0):
+        if model in self._models:
+            model_id = self._models.index(model)
+        else:
+            model_id = len(self._models)
+            self._models.append(model)
+
+        self._step_numbers.append(step_number)
+        self._model_ids.append(model_id)
+        self._input_tokens.append(input_tokens)
+        self._output_tokens.append(output_tokens)
+        self._cost_usd.append(cost_usd)
+        self._is_tool_call.append(is_tool_call)
+        self._cached_tokens.append(cached_tokens)
+
+        self.total_cost_usd += cost_usd
+        self.total_input_tokens += input_tokens
+        self.total_output_tokens += output_tokens
+        self.total_cached_tokens += cached_tokens
+
+    def freeze(self):
+        """Swap the step columns for compact NumPy arrays. No steps can be added afterwards."""
+        self._step_numbers = np.asarray(self._step_numbers, dtype=np.int32)
+        self._model_ids = np.asarray(self._model_ids, dtype=np.int16)
+        self._input_tokens = np.asarray(self._input_tokens, dtype=np.int64)
+        self._output_tokens = np.asarray(self._output_tokens, dtype=np.int64)
+        self._cost_usd = np.asarray(self._cost_usd, dtype=np.float64)
+        self._is_tool_call = np.asarray(self._is_tool_call, dtype=np.bool_)
+        self._cached_tokens = np.asarray(self._cached_tokens, dtype=np.int64)
 
-    def add_step(self, step: StepCost):
-        self.steps.append(step)
-        self.total_cost_usd += step.cost_usd
-        self.total_input_tokens += step.input_tokens
-        self.total_output_tokens += step.output_tokens
+    @property
+    def num_steps(self) -> int:
+        return len(self._step_numbers)
+
+    @property
+    def steps(self) -> list[StepCost]:
+        return [
+            StepCost(
+                step_number=int(self._step_numbers[i]),
+                model=self._models[self._model_ids[i]],
+                input_tokens=int(self._input_tokens[i]),
+                output_tokens=int(self._output_tokens[i]),
+                cost_usd=float(self._cost_usd[i]),
+                is_tool_call=bool(self._is_tool_call[i]),
+                cached_tokens=int(self._cached_tokens[i]),
+            )
+            for i in range(self.num_steps)
+        ]
 
 class CostTracker:
     """
@@ -34,86 +120,112 @@ class CostTracker:
     def __init__(self):
         self.queries: list[QueryCost] = []
         self._current_query: QueryCost | None = None
+        self._print_buffer: list[str] = []  # reused by print_cost_breakdown
+        # Frozen per-query columns, kept for vectorized totals
+        self._all_costs: list[np.ndarray] = []
+        self._all_input_tokens: list[np.ndarray] = []
+        self._all_output_tokens: list[np.ndarray] = []
 
     def start_query(self, query: str):
         self._current_query = QueryCost(query=query)
 
-    def log_completion(self, step_number: int, response, is_tool_call: bool = False):
+    def log_completion(self, step_number: int, response, is_tool_call: bool = False) -> StepCost | None:
         """
         Log a completion response's cost.
+
+        Returns the recorded StepCost, or None if nothing could be logged.
         """
         # Check if _current_query exists
         if not self._current_query:
             logger.warning("No active query to log completion to")
-            return
+            return None
         
         # Extract usage stats from response
         usage = getattr(response, 'usage', None)
         if not usage:
             logger.warning("Response has no usage data")
-            return
+            return None
         
         input_tokens = getattr(usage, 'prompt_tokens', 0)
         output_tokens = getattr(usage, 'completion_tokens', 0)
-        model = getattr(response, 'model', 'gpt-4o-mini')
+        model = getattr(response, 'model', None) or DEFAULT_MODEL
+        # Prompt-cache hits (litellm reports them OpenAI-style for all providers)
+        cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0
         
-        # Calculate cost (fallback pricing)
-        # GPT-4o-mini: $0.15/1M input, $0.60/1M output
-        input_cost = (input_tokens / 1_000_000) * 0.15
-        output_cost = (output_tokens / 1_000_000) * 0.60
-        total_cost = input_cost + output_cost
+        cost_usd = _cost(model, input_tokens, output_tokens, cached_tokens)
+        self._current_query.add_step(step_number, model, input_tokens, output_tokens, cost_usd, is_tool_call, cached_tokens)
         
-        # Create StepCost and add to query
-        step_cost = StepCost(
+        logger.info(f"Step {step_number}: {input_tokens} in ({cached_tokens} cached), {output_tokens} out, ${cost_usd:.6f}")
+        return StepCost(
             step_number=step_number,
             model=model,
             input_tokens=input_tokens,
             output_tokens=output_tokens,
-            cost_usd=total_cost,
-            is_tool_call=is_tool_call
+            cost_usd=cost_usd,
+            is_tool_call=is_tool_call,
+            cached_tokens=cached_tokens
         )
-        
-        self._current_query.add_step(step_cost)
-        
-        logger.info(f"Step {step_number}: {input_tokens} in, {output_tokens} out, ${total_cost:.6f}")
 
     def end_query(self):
         if self._current_query:
-            self.queries.append(self._current_query)
+            query = self._current_query
+            query.freeze()
+            self.queries.append(query)
+            self._all_costs.append(query._cost_usd)
+            self._all_input_tokens.append(query._input_tokens)
+            self._all_output_tokens.append(query._output_tokens)
             self._current_query = None
 
+    def totals(self) -> tuple[float, int, int]:
+        """Return (cost_usd, input_tokens, output_tokens) over all finished queries."""
+        if not self._all_costs:
+            return 0.0, 0, 0
+        return (
+            float(np.concatenate(self._all_costs).sum()),
+            int(np.concatenate(self._all_input_tokens).sum()),
+            int(np.concatenate(self._all_output_tokens).sum()),
+        )
+
     def print_cost_breakdown(self):
         """Print detailed cost breakdown"""
         if not self.queries:
             print("No queries tracked yet.")
             return
         
-        print("\n" + "="*60)
-        print("COST BREAKDOWN")
-        print("="*60)
+        # Build the whole report first and emit it with a single write
+        lines = self._print_buffer
+        lines.clear()
         
-        total_cost = 0.0
-        total_input = 0
-        total_output = 0
+        lines.append("\n" + "="*60)
+        lines.append("COST BREAKDOWN")
+        lines.append("="*60)
         
         for i, query in enumerate(self.queries, 1):
-            print(f"\nQuery {i}: {query.query[:50]}...")
-            print(f"  Total Cost: ${query.total_cost_usd:.6f}")
-            print(f"  Tokens: {query.total_input_tokens} in, {query.total_output_tokens} out")
-            print(f"  Steps: {len(query.steps)}")
+            lines.append(f"\nQuery {i}: {query.query[:50]}...")
+            lines.append(f"  Total Cost: ${query.total_cost_usd:.6f}")
+            lines.append(f"  Tokens: {query.total_input_tokens} in, {query.total_output_tokens} out")
+            lines.append(f"  Steps: {query.num_steps}")
             
-            for step in query.steps:
-                step_type = "Tool Call" if step.is_tool_call else "Response"
-                print(f"    Step {step.step_number} ({step_type}): ${step.cost_usd:.6f} - {step.input_tokens}/{step.output_tokens} tokens")
+            steps = query.steps
+            if query.total_cached_tokens:
+                savings = sum(
+                    _cost(step.model, step.input_tokens, step.output_tokens) - step.cost_usd
+                    for step in steps
+                )
+                lines.append(f"  Prompt cache: {query.total_cached_tokens} tokens, saved ${savings:.6f}")
             
-            total_cost += query.total_cost_usd
-            total_input += query.total_input_tokens
-            total_output += query.total_output_tokens
+            for step in steps:
+                step_type = "Tool Call" if step.is_tool_call else "Response"
+                lines.append(f"    Step {step.step_number} ({step_type}): ${step.cost_usd:.6f} - {step.input_tokens}/{step.output_tokens} tokens")
+        
+        total_cost, total_input, total_output = self.totals()
+        lines.append("\n" + "="*60)
+        lines.append(f"TOTAL: ${total_cost:.6f}")
+        lines.append(f"TOKENS: {total_input} input, {total_output} output")
+        lines.append("="*60 + "\n")
         
-        print("\n" + "="*60)
-        print(f"TOTAL: ${total_cost:.6f}")
-        print(f"TOKENS: {total_input} input, {total_output} output")
-        print("="*60 + "\n")
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
 
 # Global cost tracker instance
 cost_tracker = CostTracker()
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Merging of identical concurrent LLM calls.
+
+In this app the batcher is effectively a pass-through. Tool-using steps stream,
+and run_batch sets `n` itself, so both bypass the window. Only tool-free
+answers (e.g. the Writer's) wait in it, and agents never send identical
+kwargs, so those calls gain nothing and pay up to `max_wait_ms` of delay.
+Merging pays off when the same request is fired concurrently, e.g. several
+copies of one agent sampling the same prompt.
+"""
+import asyncio
+import copy
+import logging
+from dataclasses import dataclass
+
+import orjson
+from litellm import UnsupportedParamsError, acompletion
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PendingCall:
+    kwargs: dict
+    future: asyncio.Future
+
+class LLMBatcher:
+    """
+    Merges identical concurrent LLM calls into a single request.
+
+    Non-streaming calls submitted within `max_wait_ms` of each other (up to
+    `max_batch`) are grouped by their full kwargs (model, messages, tools, ...).
+    A group of k identical calls is sent once with `n=k` and each caller gets
+    one of the returned choices, with an even share of the token usage.
+
+    Streaming calls, and calls that already set `n`, cannot be merged and are
+    sent immediately.
+    """
+    def __init__(self, max_batch: int = 16, max_wait_ms: float = 5.0):
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def submit(self, **kwargs):
+        """Queue an `acompletion` call and wait for its response."""
+        if kwargs.get("stream") or "n" in kwargs:
+            return await acompletion(**kwargs)
+        loop = self._ensure_worker()
+        future = loop.create_future()
+        self._queue.put_nowait(PendingCall(kwargs=kwargs, future=future))
+        return await future
+
+    def _ensure_worker(self) -> asyncio.AbstractEventLoop:
+        # The queue and worker belong to one event loop; restart them if the
+        # batcher is reused from a new loop (e.g. a second asyncio.run()).
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._drain())
+        return loop
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_ms / 1000
+
+            # Collect more calls until the batch is full or the window closes
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups: dict = {}
+            for call in batch:
+                groups.setdefault(self._group_key(call), []).append(call)
+
+            logger.debug(f"Dispatching {len(batch)} LLM call(s) as {len(groups)} request(s)")
+            for calls in groups.values():
+                if len(calls) == 1:
+                    self._dispatch(calls[0])
+                else:
+                    loop.create_task(self._dispatch_merged(calls))
+
+    @staticmethod
+    def _group_key(call: PendingCall):
+        try:
+            return orjson.dumps(call.kwargs, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return id(call)  # not serializable, never merged
+
+    def _dispatch(self, call: PendingCall):
+        task = asyncio.get_running_loop().create_task(acompletion(**call.kwargs))
+        task.add_done_callback(lambda t, f=call.future: self._resolve(f, t))
+
+    async def _dispatch_merged(self, calls: list[PendingCall]):
+        try:
+            response = await acompletion(**calls[0].kwargs, n=len(calls))
+        except UnsupportedParamsError:
+            # The provider has no `n`; send the calls one by one instead
+            for call in calls:
+                self._dispatch(call)
+            return
+        except Exception as e:
+            for call in calls:
+                if not call.future.done():
+                    call.future.set_exception(e)
+            return
+
+        parts = self._split_response(response, len(calls))
+        for call, part in zip(calls, parts):
+            if not call.future.done():
+                call.future.set_result(part)
+        # Some providers return fewer choices than asked for
+        for call in calls[len(parts):]:
+            self._dispatch(call)
+
+    @staticmethod
+    def _split_response(response, k: int) -> list:
+        """Split an `n=k` response into single-choice responses sharing its usage."""
+        usage = getattr(response, "usage", None)
+        parts = []
+        for i, choice in enumerate(response.choices[:k]):
+            part = copy.copy(response)
+            part.choices = [choice]
+            if usage is not None:
+                part.usage = _share_usage(usage, i, k)
+            parts.append(part)
+        return parts
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, task: asyncio.Task):
+        if task.cancelled():
+            future.cancel()
+            return
+        # Always retrieve the exception so it is never reported as unhandled
+        exception = task.exception()
+        if future.cancelled():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(task.result())
+
+def _share_usage(usage, i: int, k: int):
+    """The i-th of k even shares of a usage record (the first share takes the remainder)."""
+    def share(tokens):
+        tokens = tokens or 0
+        return tokens // k + (tokens % k if i == 0 else 0)
+
+    part = copy.copy(usage)
+    part.prompt_tokens = share(usage.prompt_tokens)
+    part.completion_tokens = share(usage.completion_tokens)
+    part.total_tokens = part.prompt_tokens + part.completion_tokens
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None and getattr(details, "cached_tokens", None):
+        part.prompt_tokens_details = copy.copy(details)
+        part.prompt_tokens_details.cached_tokens = share(details.cached_tokens)
+    return part
+
+# Global batcher instance shared by all agents
+llm_batcher = LLMBatcher()
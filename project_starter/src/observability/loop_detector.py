@@ -1,5 +1,7 @@
 from dataclasses import dataclass
 
+import xxhash
+
 @dataclass
 class LoopDetectionResult:
     is_looping: bool
@@ -21,6 +23,7 @@ class AdvancedLoopDetector:
         self.fuzzy_threshold = fuzzy_threshold
         self.stagnation_window = stagnation_window
         self.tool_history: list[tuple[str, str]] = []  # (tool_name, args_str)
+        self._call_counts: dict[int, int] = {}  # call signature -> times seen
         self.output_history: list[str] = []
 
     def _jaccard_similarity(self, s1: str, s2: str) -> float:
@@ -40,6 +43,11 @@ class AdvancedLoopDetector:
         union = tokens1 | tokens2
         return len(intersection) / len(union)
 
+    @staticmethod
+    def _signature(tool_name: str, tool_input: str) -> int:
+        """64-bit xxh3 hash identifying a (tool, arguments) pair."""
+        return xxhash.xxh3_64_intdigest(tool_name.encode() + b"|" + tool_input.encode())
+
     def check_tool_call(self, tool_name: str, tool_input: str) -> LoopDetectionResult:
         """
         Check if a tool call indicates a loop.
@@ -48,10 +56,11 @@ class AdvancedLoopDetector:
         current = (tool_name, tool_input.strip())
 
         # Strategy 1: Exact Match
-        exact_count = sum(
-            1 for past_tool, past_input in self.tool_history
-            if (past_tool, past_input.strip()) == current
-        )
+        # O(1) lookup of how often this exact call was seen, instead of
+        # rescanning the whole history
+        signature = self._signature(*current)
+        exact_count = self._call_counts.get(signature, 0)
+        self._call_counts[signature] = exact_count + 1
 
         if exact_count >= self.exact_threshold:
             self.tool_history.append(current)
@@ -138,4 +147,5 @@ class AdvancedLoopDetector:
 
     def reset(self):
         self.tool_history.clear()
+        self._call_counts.clear()
         self.output_history.clear()
@@ -1,21 +1,28 @@
-import json
 import time
 import uuid
-from dataclasses import asdict, dataclass, field
+from collections import deque
+from dataclasses import dataclass, field
 from typing import Optional
 
+import orjson
 import structlog
 
 logger = structlog.get_logger()
 
-@dataclass
+def _json_default(obj):
+    """orjson fallback for types it does not serialize natively."""
+    if isinstance(obj, deque):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+@dataclass(slots=True)
 class ToolCallRecord:
     tool_name: str
     tool_input: dict
     tool_output: str
     duration_ms: float
 
-@dataclass
+@dataclass(slots=True)
 class AgentStep:
     step_number: int
     reasoning: Optional[str]
@@ -32,7 +39,7 @@ class Trace:
     agent_name: str
     input_query: str
     model: str = ""
-    steps: list[AgentStep] = field(default_factory=list)
+    steps: deque[AgentStep] = field(default_factory=deque)
     final_output: Optional[str] = None
     total_input_tokens: int = 0
     total_output_tokens: int = 0
@@ -45,10 +52,17 @@ class AgentTracer:
     """
     Captures agent execution flow for debugging and analysis.
     """
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False, max_history: Optional[int] = None,
+                 max_traces: Optional[int] = 1000):
         self._traces: dict[str, Trace] = {}
         self._active_trace_id: Optional[str] = None
         self.verbose = verbose
+        # Keep at most this many steps per trace (oldest are dropped first);
+        # totals still count every step. None keeps them all.
+        self.max_history = max_history
+        # Keep at most this many traces; the oldest finished ones are dropped
+        # first. None keeps them all.
+        self.max_traces = max_traces
 
     def start_trace(self, agent_name: str, query: str, model: str = "") -> str:
         """Start a new trace for an agent execution."""
@@ -58,12 +72,22 @@ class AgentTracer:
             agent_name=agent_name,
             input_query=query,
             model=model,
+            steps=deque(maxlen=self.max_history),
         )
         self._active_trace_id = trace_id
+        if self.max_traces is not None and len(self._traces) > self.max_traces:
+            self._evict_oldest_trace()
 
         logger.info("trace_started", trace_id=trace_id, agent_name=agent_name, model=model, query=query)
         return trace_id
 
+    def _evict_oldest_trace(self):
+        # Dicts keep insertion order, so the first finished trace is the oldest
+        for trace_id, trace in self._traces.items():
+            if trace.status != "running":
+                del self._traces[trace_id]
+                return
+
     def log_step(self, trace_id: str, step: AgentStep):
         """Log a completed step to the trace."""
         if trace_id not in self._traces:
@@ -106,7 +130,8 @@ class AgentTracer:
         """Export a trace as formatted JSON for debugging."""
         if trace_id not in self._traces:
             return "{}"
-        return json.dumps(asdict(self._traces[trace_id]), indent=2)
+        # orjson serializes dataclasses natively, without an asdict() copy
+        return orjson.dumps(self._traces[trace_id], default=_json_default, option=orjson.OPT_INDENT_2).decode()
 
 # Global tracer instance
 tracer = AgentTracer()
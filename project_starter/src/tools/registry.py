@@ -10,6 +10,8 @@ class Tool:
         self.func = func
         self.description = description
         self.model = self._create_pydantic_model(func)
+        # Checked once here so callers know whether execute() must be awaited
+        self.is_async = inspect.iscoroutinefunction(func)
 
     def _create_pydantic_model(self, func: Callable) -> type[BaseModel]:
         """Create a Pydantic model from function signature."""
@@ -84,6 +86,13 @@ class ToolRegistry:
             return func
         return decorator
 
+    def unregister(self, name: str):
+        """Remove a tool (and its category entry) from the registry."""
+        self._tools.pop(name, None)
+        for tool_names in self._categories.values():
+            if name in tool_names:
+                tool_names.remove(name)
+
     def get_tool(self, name: str) -> Tool | None:
         return self._tools.get(name)
 
@@ -1,9 +1,10 @@
-import json
 from typing import Any
 
+import orjson
+
 def safe_json_loads(json_str: str) -> Any:
     """Safely load JSON string."""
     try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
+        return orjson.loads(json_str)
+    except orjson.JSONDecodeError:
         return {}
@@ -1,15 +1,28 @@
 import sys
 import os
 import json
+import asyncio
+import gc
 import logging
 from dataclasses import dataclass
+from types import SimpleNamespace
 
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from tools.registry import registry, Tool
 from observability.loop_detector import AdvancedLoopDetector
-from observability.tracer import tracer, AgentStep, ToolCallRecord
+from observability.tracer import tracer, AgentTracer, AgentStep, ToolCallRecord
+from observability.cost_tracker import CostTracker
+from src.agent.observable_agent import ObservableAgent, llm_batcher
+from src.tools.registry import registry as agent_registry
+import src.observability.llm_batcher as batcher_module
+from src.observability.llm_batcher import LLMBatcher, _share_usage
+from litellm import UnsupportedParamsError
+from litellm.types.utils import Choices, Message, ModelResponse
+from litellm.types.utils import (
+    ChatCompletionDeltaToolCall, Delta, Function, ModelResponseStream, StreamingChoices, Usage,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -84,7 +97,266 @@ def test_tracer():
     
     logger.info("Tracer Test Passed!")
 
+def test_tracer_limits():
+    logger.info("Testing Tracer Limits...")
+    limited = AgentTracer(max_history=2, max_traces=2)
+
+    # Only the newest steps are kept, but totals count all of them
+    trace_id = limited.start_trace("VerificationAgent", "Query 0")
+    for i in range(3):
+        limited.log_step(trace_id, AgentStep(step_number=i + 1, reasoning="r", cost_usd=1.0))
+    trace = limited.get_trace(trace_id)
+    assert [step.step_number for step in trace.steps] == [2, 3]
+    assert trace.total_cost_usd == 3.0
+
+    # The oldest finished trace is dropped first; running traces are kept
+    running_id = limited.start_trace("VerificationAgent", "Query 1")
+    limited.end_trace(trace_id, "done")
+    newest_id = limited.start_trace("VerificationAgent", "Query 2")
+    assert limited.get_trace(trace_id) is None
+    assert limited.get_trace(running_id) is not None
+    assert limited.get_trace(newest_id) is not None
+
+    logger.info("Tracer Limits Test Passed!")
+
+def test_cost_tracker():
+    logger.info("Testing Cost Tracker...")
+    tracker = CostTracker()
+    tracker.start_query("Test Query")
+
+    for step_number, tokens in enumerate([(1000, 200), (3000, 400)], 1):
+        usage = SimpleNamespace(prompt_tokens=tokens[0], completion_tokens=tokens[1])
+        tracker.log_completion(step_number, SimpleNamespace(usage=usage, model="gpt-4o-mini"))
+    tracker.end_query()
+
+    query = tracker.queries[0]
+    assert query.num_steps == 2
+    assert query.total_input_tokens == 4000
+    assert query.total_output_tokens == 600
+    assert [step.input_tokens for step in query.steps] == [1000, 3000]
+    assert abs(query.total_cost_usd - sum(step.cost_usd for step in query.steps)) < 1e-12
+
+    logger.info("Cost Tracker Test Passed!")
+
+def test_streaming_dispatch():
+    logger.info("Testing Streaming Tool Dispatch...")
+    started = []
+
+    @agent_registry.register("stream_echo", "Echo text back")
+    async def stream_echo(text: str):
+        started.append(text)
+        return {"echo": text}
+
+    def chunk(delta=None, finish=None, usage=None):
+        c = ModelResponseStream(
+            model="gpt-4o-mini",
+            choices=[StreamingChoices(index=0, delta=delta or Delta(), finish_reason=finish)],
+        )
+        if usage is not None:
+            c.usage = usage
+        return c
+
+    def call_delta(index, arguments, call_id=None):
+        return chunk(Delta(tool_calls=[ChatCompletionDeltaToolCall(
+            index=index, id=call_id, type="function" if call_id else None,
+            function=Function(name="stream_echo" if call_id else None, arguments=arguments),
+        )]))
+
+    started_before_end = []
+
+    async def fake_stream():
+        yield chunk(Delta(role="assistant", content="calling tools"))
+        # Call 0: arguments split across chunks
+        yield call_delta(0, "", call_id="call_split")
+        yield call_delta(0, '{"text": ')
+        yield call_delta(0, '"hello"}')
+        # Call 1: arguments that never form valid JSON
+        yield call_delta(1, '{"text": ', call_id="call_bad")
+        # Call 2: a repeat the loop detector flags
+        yield call_delta(2, '{"text": "again"}', call_id="call_loop")
+        await asyncio.sleep(0)
+        started_before_end.extend(started)
+        yield chunk(finish="tool_calls")
+        yield chunk(usage=Usage(prompt_tokens=10, completion_tokens=5, total_tokens=15))
+
+    async def fake_submit(**kwargs):
+        assert kwargs["stream"] is True
+        return fake_stream()
+
+    async def run_stream():
+        agent = ObservableAgent(model="stream-test", tools=[agent_registry.get_tool("stream_echo")], verbose=False)
+        for _ in range(2):
+            agent.loop_detector.check_tool_call("stream_echo", '{"text": "again"}')
+        response, tool_jobs = await agent._stream_completion([{"role": "user", "content": "hi"}])
+        outputs = {}
+        for call_id, job in tool_jobs.items():
+            outputs[call_id] = (await job)[2] if isinstance(job, asyncio.Task) else job
+        return response, outputs
+
+    original_submit = llm_batcher.submit
+    llm_batcher.submit = fake_submit
+    try:
+        response, outputs = asyncio.run(run_stream())
+    finally:
+        llm_batcher.submit = original_submit
+        agent_registry.unregister("stream_echo")
+
+    # The split call started while the stream was still open
+    assert started_before_end == ["hello"]
+    assert json.loads(outputs["call_split"]) == {"echo": "hello"}
+    assert outputs["call_bad"].startswith("Error executing stream_echo: invalid JSON arguments")
+    assert outputs["call_loop"].startswith("⚠️ LOOP DETECTED")
+    assert started == ["hello"]
+    assert agent_registry.get_tool("stream_echo") is None
+
+    # The reassembled response keeps every call, in order, with its full arguments
+    tool_calls = response.choices[0].message.tool_calls
+    assert [tc.id for tc in tool_calls] == ["call_split", "call_bad", "call_loop"]
+    assert tool_calls[0].function.arguments == '{"text": "hello"}'
+    assert response.usage.prompt_tokens == 10
+
+    logger.info("Streaming Tool Dispatch Test Passed!")
+
+def test_run_batch():
+    logger.info("Testing Batched Prompts...")
+    batch_reply = {}
+    calls = []
+
+    async def fake_submit(**kwargs):
+        assert "tools" not in kwargs, "batched prompts must not be offered tools"
+        calls.append(kwargs)
+        prompt = kwargs["messages"][-1]["content"]
+        content = batch_reply["text"] if "### Prompt" in prompt else f"single answer to {prompt}"
+        return SimpleNamespace(
+            model="gpt-4o-mini",
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content, tool_calls=None))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5),
+        )
+
+    async def run_batch(prompts):
+        noop = Tool("noop", lambda: "", "Does nothing")
+        agent = ObservableAgent(model="batch-test", tools=[noop], verbose=False)
+        return agent, await agent.run_batch(prompts)
+
+    original_submit = llm_batcher.submit
+    llm_batcher.submit = fake_submit
+    try:
+        # Answers are matched to prompts by their number, not their position
+        batch_reply["text"] = "### Answer 2\nsecond\n\n### Answer 1\nfirst"
+        agent, results = asyncio.run(run_batch(["p1", "p2"]))
+        assert [r["answer"] for r in results] == ["first", "second"]
+        assert agent.tracer.get_trace(results[0]["trace_id"]).status == "completed"
+
+        # Duplicate or missing numbers fall back to one call per prompt, and the
+        # discarded batch is traced as a failure
+        for text in ("### Answer 1\nfirst\n\n### Answer 1\nagain", "no headers at all"):
+            batch_reply["text"] = text
+            calls.clear()
+            agent, results = asyncio.run(run_batch(["p1", "p2"]))
+            assert [r["answer"] for r in results] == ["single answer to p1", "single answer to p2"]
+            assert len(calls) == 3
+            statuses = [trace.status for trace in agent.tracer._traces.values()]
+            assert statuses == ["error", "completed", "completed"], statuses
+
+        # A single prompt is answered without tools too
+        agent, results = asyncio.run(run_batch(["p1"]))
+        assert results[0]["answer"] == "single answer to p1"
+    finally:
+        llm_batcher.submit = original_submit
+
+    logger.info("Batched Prompts Test Passed!")
+
+def test_llm_batcher():
+    logger.info("Testing LLM Batcher...")
+    sent = []
+    behaviour = {}
+
+    async def fake_acompletion(**kwargs):
+        sent.append(kwargs.get("n"))
+        if "n" in kwargs and behaviour.get("reject_n"):
+            raise UnsupportedParamsError("n is not supported", llm_provider="test", model="test")
+        n = min(kwargs.get("n", 1), behaviour.get("max_choices", 99))
+        return ModelResponse(
+            model="gpt-4o-mini",
+            choices=[Choices(index=i, message=Message(content=f"choice {i}")) for i in range(n)],
+            usage=Usage(prompt_tokens=10, completion_tokens=7, total_tokens=17),
+        )
+
+    async def submit_same(count):
+        batcher = LLMBatcher(max_wait_ms=20)
+        messages = [{"role": "user", "content": "same"}]
+        return await asyncio.gather(*(batcher.submit(model="gpt-4o-mini", messages=messages) for _ in range(count)))
+
+    # Usage shares add up to the original, the first share takes the remainder
+    shares = [_share_usage(Usage(prompt_tokens=10, completion_tokens=7, total_tokens=17), i, 3) for i in range(3)]
+    assert [(u.prompt_tokens, u.completion_tokens, u.total_tokens) for u in shares] == [(4, 3, 7), (3, 2, 5), (3, 2, 5)]
+
+    original_acompletion = batcher_module.acompletion
+    batcher_module.acompletion = fake_acompletion
+    try:
+        # Identical calls are merged into one n=k request and split per caller
+        sent.clear()
+        responses = asyncio.run(submit_same(3))
+        assert sent == [3]
+        assert [r.choices[0].message.content for r in responses] == ["choice 0", "choice 1", "choice 2"]
+        assert all(len(r.choices) == 1 for r in responses)
+        assert sum(r.usage.prompt_tokens for r in responses) == 10
+        assert sum(r.usage.completion_tokens for r in responses) == 7
+
+        # A provider without n gets the calls one by one
+        sent.clear()
+        behaviour.update(reject_n=True)
+        responses = asyncio.run(submit_same(2))
+        assert sent == [2, None, None]
+        assert all(r.choices[0].message.content == "choice 0" for r in responses)
+
+        # Missing choices are made up by individual calls
+        sent.clear()
+        behaviour.update(reject_n=False, max_choices=1)
+        responses = asyncio.run(submit_same(3))
+        assert sent == [3, None, None]
+        assert len(responses) == 3
+    finally:
+        batcher_module.acompletion = original_acompletion
+
+    async def resolve_after_cancel():
+        loop = asyncio.get_running_loop()
+        unhandled = []
+        loop.set_exception_handler(lambda loop, context: unhandled.append(context))
+
+        async def fail():
+            raise RuntimeError("provider error")
+
+        # The caller went away: the task's error is consumed, not reported
+        future = loop.create_future()
+        future.cancel()
+        task = loop.create_task(fail())
+        await asyncio.sleep(0)
+        LLMBatcher._resolve(future, task)
+        del task
+        gc.collect()
+
+        # A cancelled request cancels the caller's future
+        future = loop.create_future()
+        task = loop.create_task(asyncio.sleep(1))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.sleep(0)
+        LLMBatcher._resolve(future, task)
+        return unhandled, future.cancelled()
+
+    unhandled, cancelled = asyncio.run(resolve_after_cancel())
+    assert unhandled == [], unhandled
+    assert cancelled
+
+    logger.info("LLM Batcher Test Passed!")
+
 if __name__ == "__main__":
     test_registry()
-    test_loop_detector()
     test_tracer()
+    test_tracer_limits()
+    test_cost_tracker()
+    test_streaming_dispatch()
+    test_run_batch()
+    test_llm_batcher()
+    test_loop_detector()